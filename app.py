@@ -1,71 +1,665 @@
 import os
+import sys
+import time
+import heapq
 import shutil
 import tempfile
 import threading
+import subprocess
+import queue
+import uuid
+import hashlib
+import errno
+import socket
+import ssl
+import select
+import struct
+import re
+import atexit
 import logging
-from flask import Flask, request, send_file, jsonify
+import unicodedata
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows dev machines
+    fcntl = termios = None
+from flask import Flask, Response, request, send_file, jsonify, url_for
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import dump_options_header
+from werkzeug.wsgi import wrap_file
+import orjson
 import yt_dlp
-import mimetypes
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+class OrjsonProvider(JSONProvider):
+    """Route jsonify / request.get_json through orjson's C serializer."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # jsonify() would otherwise decode dumps() to str only to re-encode it
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s] [%(levelname)s] %(message)s",
-)
+# Requests only enqueue records; a listener thread formats and writes them,
+# so a slow stderr never holds a request behind the handler lock.
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s"))
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _log_handler, respect_handler_level=True)
+# QueueHandler only merges args (and any traceback) into the message
+logging.basicConfig(level=logging.INFO, format="%(message)s", handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
+atexit.register(_log_listener.stop)  # flush what is still queued
 
 DOWNLOAD_FOLDER = "downloads"
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 
+# Small on-disk fallbacks are staged on tmpfs so yt-dlp's fragment and merge
+# writes stay off the disk; only the finished file is copied into the cache
+MEMORY_FOLDER = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+MEMORY_MAX_BYTES = int(os.environ.get("MEMORY_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def _is_out_of_space(error: BaseException) -> bool:
+    """ENOSPC anywhere in the chain (yt-dlp wraps OSErrors and ffmpeg stderr)."""
+    while error is not None:
+        if isinstance(error, OSError) and error.errno == errno.ENOSPC:
+            return True
+        if "No space left on device" in str(error):
+            return True
+        exc_info = getattr(error, "exc_info", None)  # yt_dlp DownloadError
+        error = error.__cause__ or error.__context__ or (exc_info[1] if exc_info else None)
+    return False
+
+
+def tmpfs_has_room(info_dict: dict, size_hint) -> bool:
+    """Whether a download of size_hint bytes fits in MEMORY_FOLDER right now.
+
+    A merge keeps both inputs next to the merged output, so it needs about
+    twice the hint; /dev/shm is shared with every other request (and is
+    only 64 MiB in a default Docker container).
+    """
+    if not MEMORY_FOLDER or not size_hint or size_hint > MEMORY_MAX_BYTES:
+        return False
+    needed = size_hint * 2 if info_dict.get("requested_formats") else size_hint
+    try:
+        st = os.statvfs(MEMORY_FOLDER)
+    except OSError:
+        return False
+    return st.f_bavail * st.f_frsize >= needed
+
 
 # === Cleanup Utilities ===
+# One reaper thread drains a min-heap of (deadline, path, is_dir) entries,
+# instead of a threading.Timer per scheduled deletion.
+_cleanup_heap = []
+_cleanup_cv = threading.Condition(threading.Lock())
+_reaper = None
+
+
+def _empty_dir(path):
+    """Unlink the files in one of our temp folders (normally just one or two).
+
+    A single scandir + unlink per entry; nested folders (rare fragment
+    leftovers) are handed to shutil.rmtree.
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.unlink(entry.path)
+
+
+def _remove_dir(path):
+    """Remove one of our temp folders. Returns False if it is still there."""
+    try:
+        _empty_dir(path)
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+        return not os.path.lexists(path)
+    return True
+
+
+def _delete_path(path, is_dir):
+    """Delete a file or folder now. Returns False if it is still there."""
+    try:
+        if is_dir:
+            if not _remove_dir(path):
+                return False
+            logging.info("[CLEANUP] Folder deleted: %s", path)
+        else:
+            os.remove(path)
+            logging.info("[CLEANUP] File deleted: %s", path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.error("[CLEANUP ERROR] Could not delete %s: %s", path, e)
+        return False
+    return True
+
+
+def _reap_forever():
+    next_sweep = time.monotonic()  # first job sweep as soon as the reaper starts
+    while True:
+        with _cleanup_cv:
+            # Sleep until the next deadline or job sweep, or until an earlier
+            # deadline is scheduled
+            while True:
+                now = time.monotonic()
+                wake = min(_cleanup_heap[0][0], next_sweep) if _cleanup_heap else next_sweep
+                if wake <= now:
+                    break
+                _cleanup_cv.wait(wake - now)
+            due = []
+            while _cleanup_heap and _cleanup_heap[0][0] <= now:
+                due.append(heapq.heappop(_cleanup_heap))
+
+        # Deleted outside the lock; a path scheduled twice is just a no-op here
+        for _, path, is_dir in due:
+            _delete_path(path, is_dir)
+
+        # Catches job folders whose delayed delete died with another worker
+        if now >= next_sweep:
+            next_sweep = now + JOB_SWEEP_INTERVAL
+            try:
+                sweep_jobs()
+            except Exception as e:
+                logging.error("[CLEANUP ERROR] Job sweep failed: %s", e)
+
+
+def _start_reaper_locked():
+    global _reaper
+    if _reaper is None:
+        _reaper = threading.Thread(target=_reap_forever, name="cleanup-reaper", daemon=True)
+        _reaper.start()
+
+
+def start_reaper():
+    """Start this process's cleanup reaper (and its job sweeps) if not running.
+
+    Called once the process is final, after gunicorn's fork, since a thread
+    started before it would not survive into the worker.
+    """
+    with _cleanup_cv:
+        _start_reaper_locked()
+
+
 def schedule_delete(path, delay=10, is_dir=False):
     """Delete a file or folder after a delay."""
-    def _delete():
+    entry = (time.monotonic() + delay, path, is_dir)
+    with _cleanup_cv:
+        heapq.heappush(_cleanup_heap, entry)
+        if _reaper is None:
+            _start_reaper_locked()
+        elif _cleanup_heap[0] is entry:
+            # Only a new earliest deadline changes how long the reaper sleeps
+            _cleanup_cv.notify()
+
+
+# === Workspace Pool ===
+# Empty per-request folders under DOWNLOAD_FOLDER are recycled instead of
+# paying mkdir/rmdir and inode allocation on every download. Folders carry the
+# worker's pid so gunicorn's child_exit hook (gunicorn.conf.py) can remove a
+# dead worker's pool and partial downloads; on_starting sweeps the rest.
+WORKSPACE_PREFIX = f"workspace-{os.getpid()}-"
+MEMORY_WORKSPACE_PREFIX = f"yt-dlp-api-{os.getpid()}-"
+WORKSPACE_POOL_SIZE = int(os.environ.get("WORKSPACE_POOL_SIZE", 8))
+
+_workspace_pool = queue.Queue(maxsize=WORKSPACE_POOL_SIZE)
+
+
+def acquire_workspace(in_memory=False) -> str:
+    """Return an empty folder for one download."""
+    if in_memory:
+        return tempfile.mkdtemp(prefix=MEMORY_WORKSPACE_PREFIX, dir=MEMORY_FOLDER)
+    try:
+        return _workspace_pool.get_nowait()
+    except queue.Empty:
+        return tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=DOWNLOAD_FOLDER)
+
+
+def release_workspace(path) -> bool:
+    """Empty a download folder and recycle it. Returns False if it is still in use."""
+    if not os.path.basename(path).startswith(WORKSPACE_PREFIX):
+        return _delete_path(path, is_dir=True)
+    try:
+        _empty_dir(path)
+    except FileNotFoundError:
+        return True
+    except OSError:
+        # e.g. platforms that refuse to unlink open files
+        return False
+    try:
+        _workspace_pool.put_nowait(path)
+    except queue.Full:
+        return _delete_path(path, is_dir=True)
+    return True
+
+
+def discard_workspace(path):
+    """Release a download folder, retrying from the reaper if files are still in use."""
+    if not release_workspace(path):
+        # Platforms that refuse to unlink open files
+        schedule_delete(path, delay=20, is_dir=True)
+
+
+def _remove_own_workspaces():
+    """Delete every folder this process created (pooled or mid-download)."""
+    for folder, prefix in ((DOWNLOAD_FOLDER, WORKSPACE_PREFIX), (MEMORY_FOLDER, MEMORY_WORKSPACE_PREFIX)):
+        if not folder:
+            continue
         try:
-            if is_dir:
-                shutil.rmtree(path, ignore_errors=True)
-                logging.info(f"[CLEANUP] Folder deleted: {path}")
-            elif os.path.exists(path):
-                os.remove(path)
-                logging.info(f"[CLEANUP] File deleted: {path}")
-        except Exception as e:
-            logging.error(f"[CLEANUP ERROR] Could not delete {path}: {e}")
+            with os.scandir(folder) as it:
+                stale = [entry.path for entry in it if entry.name.startswith(prefix)]
+        except OSError:
+            continue
+        for path in stale:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+for _ in range(WORKSPACE_POOL_SIZE):
+    _workspace_pool.put_nowait(tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=DOWNLOAD_FOLDER))
+# child_exit covers workers that are killed; this covers `python app.py`,
+# test imports and orderly worker shutdowns
+atexit.register(_remove_own_workspaces)
 
-    threading.Timer(delay, _delete).start()
+
+# === Download Cache ===
+# Finished downloads are kept on disk under sha256(url), so repeat requests
+# (n8n retries, re-clicks, ranged resumes) skip yt-dlp from any worker.
+# <key>.mp4 holds the video and <key>.json its metadata; the .json mtime is
+# the entry's last use and drives both the TTL and LRU eviction.
+CACHE_FOLDER = os.path.join(DOWNLOAD_FOLDER, "cache")
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 50))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 600))
+
+
+def _cache_paths(url: str):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    base = os.path.join(CACHE_FOLDER, key)
+    return base + ".mp4", base + ".json"
+
+
+def _cache_remove(meta_path: str):
+    """Drop an entry, metadata first so readers never see it half-deleted."""
+    _delete_path(meta_path, is_dir=False)
+    _delete_path(meta_path[:-len(".json")] + ".mp4", is_dir=False)
+
+
+def _cache_prune(incoming: int):
+    """Evict expired entries, then least recently used ones, to make room."""
+    now = time.time()
+    entries = []
+    with os.scandir(CACHE_FOLDER) as it:
+        for entry in it:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                last_used = entry.stat().st_mtime
+                size = os.stat(entry.path[:-len(".json")] + ".mp4").st_size
+            except FileNotFoundError:
+                continue
+            entries.append((last_used, size, entry.path))
+
+    entries.sort()
+    count = len(entries)
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, meta_path in entries:
+        if (
+            now - last_used <= CACHE_TTL
+            and count < CACHE_MAX_ENTRIES
+            and total + incoming <= CACHE_MAX_BYTES
+        ):
+            break
+        _cache_remove(meta_path)
+        count -= 1
+        total -= size
+
+
+def cache_get(url: str):
+    """Return (file_path, metadata) for a fresh cached download, or None."""
+    file_path, meta_path = _cache_paths(url)
+    try:
+        with open(meta_path, "rb") as f:
+            last_used = os.fstat(f.fileno()).st_mtime
+            meta = orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    if time.time() - last_used > CACHE_TTL:
+        _cache_remove(meta_path)
+        return None
+    os.utime(meta_path)  # Mark as recently used
+    return file_path, meta
+
+
+def cache_put(url: str, downloaded_file: str, original_name: str, size: int):
+    """Move a finished download into the cache.
+
+    Returns (file_path, metadata) like cache_get, or None if it doesn't fit.
+    """
+    if size > CACHE_MAX_BYTES:
+        return None
+    _cache_prune(incoming=size)
+
+    file_path, meta_path = _cache_paths(url)
+    # A plain rename on disk; a tmpfs-staged file is on another filesystem,
+    # where shutil.move copies, so it lands beside the entry before the
+    # atomic replace and readers of the old entry never see half a file
+    tmp_file = f"{file_path}.{os.getpid()}.tmp"
+    shutil.move(downloaded_file, tmp_file)
+    os.replace(tmp_file, file_path)
+    # Fixed at insertion, so revalidating a hit needs no stat or hashing;
+    # the timestamp makes a re-download of the same URL a new entity
+    key = os.path.basename(file_path)[:16]
+    etag = f"{key}-{size}-{int(time.time())}"
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    meta = {"original_name": original_name, "size": size, "mime_type": "video/mp4", "etag": etag}
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(meta))
+    os.replace(tmp_path, meta_path)
+    return file_path, meta
 
 
 # === Core Download Logic ===
-def download_with_ytdlp(url: str, temp_dir: str) -> str:
-    """Download the highest-quality video using yt_dlp and return the local file path."""
-    ydl_opts = {
-        # Template for output filename
-        "outtmpl": os.path.join(temp_dir, "%(title)s.%(ext)s"),
-
-        # Download best available video and audio (any format)
-        # Fallback to best combined if separate streams unavailable
-        "format": "bestvideo+bestaudio/best",
-
-        # Merge into a single MP4 container using ffmpeg
-        "merge_output_format": "mp4",
-
-        # Other options
-        "quiet": True,
-        "retries": 3,
-        "socket_timeout": 30,
-        "noprogress": True,
-        "ignoreerrors": False,
-
-        # Clean metadata (optional)
-        "postprocessors": [
-            {"key": "FFmpegMetadata"},
-        ],
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info_dict = ydl.extract_info(url, download=True)
+FRAGMENT_CONCURRENCY = int(os.environ.get("FRAGMENT_CONCURRENCY", 8))
+HTTP_CHUNK_SIZE = 10 * 1024 * 1024
+
+YDL_OPTS = {
+    # Download best available video and audio (any format)
+    # Fallback to best combined if separate streams unavailable
+    "format": "bestvideo+bestaudio/best",
+
+    # Merge into a single MP4 container using ffmpeg
+    # (yt-dlp's merger already stream-copies with -c copy; no re-encode)
+    "merge_output_format": "mp4",
+
+    # Segmented (DASH/HLS) formats fetch fragments in parallel; plain HTTP
+    # is pulled in 10 MiB ranges, which sidesteps per-connection throttling
+    "concurrent_fragment_downloads": FRAGMENT_CONCURRENCY,
+    "http_chunk_size": HTTP_CHUNK_SIZE,
+    "fragment_retries": 3,
+
+    # Other options
+    "quiet": True,
+    "retries": 3,
+    "socket_timeout": 30,
+    "noprogress": True,
+    "ignoreerrors": False,
+}
+
+# aria2c runs the fragment loop in C with its own connection pool; only used
+# when the image ships it
+if shutil.which("aria2c"):
+    YDL_OPTS["external_downloader"] = {"default": "aria2c"}
+    YDL_OPTS["external_downloader_args"] = {"aria2c": ["-x", "8", "-s", "8", "-k", "1M"]}
+
+# Bytes read from the yt-dlp / ffmpeg pipe per response chunk
+CHUNK_SIZE = 1024 * 1024
+
+# Protocols yt-dlp can write to stdout as a playable MP4 with no fixup pass
+YTDLP_PIPE_PROTOCOLS = ("http", "https", "http_dash_segments")
+
+# Protocols ffmpeg can open directly as an input URL
+FFMPEG_INPUT_PROTOCOLS = ("http", "https", "m3u8", "m3u8_native")
+
+
+# Template for output filename
+OUTTMPL = "%(title)s.%(ext)s"
+
+# Idle YoutubeDL instances. Building one compiles the extractor registry and
+# sets up cookies and HTTP handlers, so each worker pays that once per
+# concurrent slot instead of per call. An instance is checked out by a single
+# request at a time because its params (outtmpl) are per-request.
+# Each instance also owns yt-dlp's requests-based HTTP handler (requests and
+# urllib3 are in requirements.txt), whose keep-alive session survives in the
+# pool, so back-to-back probes and downloads against the same site/CDN reuse
+# TCP+TLS connections instead of handshaking per call.
+_ydl_pool = queue.SimpleQueue()
+
+
+@contextmanager
+def pooled_ydl(temp_dir=None):
+    """Check out a YoutubeDL instance, writing into temp_dir if given."""
+    try:
+        ydl = _ydl_pool.get_nowait()
+    except queue.Empty:
+        ydl = yt_dlp.YoutubeDL(YDL_OPTS)
+    outtmpl = os.path.join(temp_dir, OUTTMPL) if temp_dir else OUTTMPL
+    ydl.params["outtmpl"] = {**ydl.params["outtmpl"], "default": outtmpl}
+    try:
+        yield ydl
+    finally:
+        _ydl_pool.put(ydl)
+
+
+def warm_up():
+    """Pay yt-dlp's cold-start cost before the first request does.
+
+    Builds a pooled YoutubeDL and runs every extractor's URL check once,
+    which compiles (and caches on the class) the ~1800 _VALID_URL patterns
+    the first extract_info() would otherwise compile inline.
+    """
+    started = time.monotonic()
+    with pooled_ydl():
+        for ie in yt_dlp.extractor.gen_extractor_classes():
+            ie.suitable("https://example.com/")
+    logging.info("[YTDLP] Warmed up in %.2fs", time.monotonic() - started)
+
+
+def probe_with_ytdlp(url: str) -> dict:
+    """Resolve the URL and select formats without downloading anything."""
+    with pooled_ydl() as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def output_filename(info_dict: dict) -> str:
+    """Return the MP4 filename the download will be served under."""
+    with pooled_ydl() as ydl:
+        name = ydl.prepare_filename(info_dict)
+    return os.path.splitext(os.path.basename(name))[0] + ".mp4"
+
+
+def build_stream_command(info_dict: dict):
+    """Return (argv, stdin bytes, resumable) that writes MP4 to stdout, or None.
+
+    A single MP4 format is piped through `yt-dlp -o -`. Separate video+audio
+    streams, and HLS, are remuxed by ffmpeg into fragmented MP4 on stdout.
+    Only other protocols (or a missing ffmpeg) need the on-disk path.
+    `resumable` is True when the bytes match the file a ranged retry serves.
+    """
+    formats = info_dict.get("requested_formats")
+    protocol = info_dict.get("protocol")
+
+    if not formats and info_dict.get("ext") == "mp4" and protocol in YTDLP_PIPE_PROTOCOLS:
+        argv = [
+            sys.executable, "-m", "yt_dlp",
+            "--quiet", "--no-warnings", "--no-part",
+            "--concurrent-fragments", str(FRAGMENT_CONCURRENCY),
+            "--http-chunk-size", str(HTTP_CHUNK_SIZE),
+            "--load-info-json", "-",
+            "-f", info_dict["format_id"],
+            "-o", "-",
+        ]
+        # Hand the already-resolved info over so yt-dlp skips re-extraction
+        info_json = orjson.dumps(yt_dlp.YoutubeDL.sanitize_info(info_dict), option=orjson.OPT_NON_STR_KEYS)
+        return argv, info_json, protocol in ("http", "https")
+
+    formats = formats or [info_dict]
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg or any(f.get("protocol") not in FFMPEG_INPUT_PROTOCOLS for f in formats):
+        return None
+
+    argv = [ffmpeg, "-nostdin", "-loglevel", "error"]
+    for fmt in formats:
+        headers = "".join(f"{k}: {v}\r\n" for k, v in (fmt.get("http_headers") or {}).items())
+        if headers:
+            argv += ["-headers", headers]
+        # ffmpeg's HTTP input never times out by default; keep the on-disk
+        # path's socket_timeout so a stalled CDN can't pin the stream forever
+        argv += [
+            "-rw_timeout", str(YDL_OPTS["socket_timeout"] * 1_000_000),  # microseconds
+            "-reconnect", "1",
+            "-i", fmt["url"],
+        ]
+    for index, fmt in enumerate(formats):
+        # Trailing "?" skips a stream kind the input turns out not to have
+        if fmt.get("vcodec") != "none":
+            argv += ["-map", f"{index}:v:0?"]
+        if fmt.get("acodec") != "none":
+            argv += ["-map", f"{index}:a:0?"]
+    argv += ["-c", "copy", "-f", "mp4", "-movflags", "frag_keyframe+empty_moov", "pipe:1"]
+    return argv, None, False
+
+
+def splice_chunks(pipe_fd: int, sock):
+    """Move everything left in the pipe to the client socket with splice(2).
+
+    The bytes never enter Python. gunicorn has already sent the headers and
+    frames the response as chunked, so each spliced run gets its own chunk
+    header here; gunicorn still writes the final 0-length chunk on close.
+    Descriptors are non-blocking under gevent, and select() is gevent's.
+    """
+    sock_fd = sock.fileno()
+    flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+    more = getattr(socket, "MSG_MORE", 0)  # header rides with the spliced data
+    trailer = b""
+    while True:
+        select.select([pipe_fd], [], [])
+        pending = struct.unpack("i", fcntl.ioctl(pipe_fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+        if not pending:
+            break  # readable but empty: the writer exited
+        sock.sendall(trailer + b"%X\r\n" % pending, more)
+        while pending:
+            try:
+                pending -= os.splice(pipe_fd, sock_fd, pending, flags=flags)
+            except BlockingIOError:
+                # The pipe holds the bytes, so it is the socket that is full
+                select.select([], [sock_fd], [])
+        trailer = b"\r\n"
+    if trailer:
+        sock.sendall(trailer)
+
+
+def _stderr_tail(errors, limit=64 * 1024) -> str:
+    """Last limit bytes a finished child wrote to its stderr file."""
+    size = errors.seek(0, os.SEEK_END)
+    errors.seek(max(0, size - limit))
+    return errors.read().decode("utf-8", "replace").strip()
+
+
+def stream_with_ytdlp(argv, stdin_data, sock=None):
+    """Start the pipe and return (first chunk, chunk generator).
+
+    The first chunk is read eagerly so a failure before any bytes are produced
+    can still be reported as a JSON error instead of an empty 200. With sock
+    (gunicorn's chunked client socket), the rest is spliced straight to it.
+    """
+    # stdout is the only pipe we drain while streaming; a stderr pipe would
+    # fill up on a chatty retry loop and block the child mid-stream
+    errors = tempfile.TemporaryFile()
+    # `yt-dlp -o -` writes DASH fragments (--Frag<N>) into its working
+    # directory, so every child gets a private one; a shared cwd would let
+    # concurrent streams read each other's fragments
+    workdir = acquire_workspace()
+    proc = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE if stdin_data else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=errors,
+        cwd=workdir,
+    )
+    # Grow the pipe from 64 KiB to CHUNK_SIZE so each wakeup drains a full
+    # chunk in one read instead of sixteen (Linux caps this at pipe-max-size)
+    if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+        try:
+            fcntl.fcntl(proc.stdout.fileno(), fcntl.F_SETPIPE_SZ, CHUNK_SIZE)
+        except OSError:
+            pass
+
+    try:
+        if stdin_data:
+            try:
+                proc.stdin.write(stdin_data)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass  # exited before reading its input; stderr says why
+        first = proc.stdout.read1(CHUNK_SIZE)
+    except Exception:
+        first = b""
+    if not first:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        error = _stderr_tail(errors)
+        errors.close()
+        proc.stdout.close()
+        if proc.stdin:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        discard_workspace(workdir)
+        raise yt_dlp.utils.DownloadError(error or f"stream exited with code {proc.returncode}")
+
+    def generate():
+        try:
+            chunk = first
+            if sock is not None:
+                # read1() is a single raw read, so nothing is left buffered
+                yield chunk
+                splice_chunks(proc.stdout.fileno(), sock)
+                chunk = b""
+            while chunk:
+                yield chunk
+                chunk = proc.stdout.read1(CHUNK_SIZE)
+            if proc.wait() != 0:
+                error = _stderr_tail(errors)
+                # Abort the chunked response so the client sees a truncated body
+                raise RuntimeError(f"Stream failed with code {proc.returncode}: {error}")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            errors.close()
+            discard_workspace(workdir)
+
+    return generate()
+
+
+def expected_size(info_dict: dict):
+    """Sum the advertised sizes of the selected formats, or None if any is unknown."""
+    formats = info_dict.get("requested_formats") or [info_dict]
+    sizes = [f.get("filesize") or f.get("filesize_approx") for f in formats]
+    return sum(sizes) if all(sizes) else None
+
+
+def download_with_ytdlp(info_dict: dict, temp_dir: str) -> str:
+    """Download the probed video into temp_dir and return the local file path."""
+    with pooled_ydl(temp_dir) as ydl:
+        info_dict = ydl.process_ie_result(info_dict, download=True)
         downloaded = ydl.prepare_filename(info_dict)
 
         # Force .mp4 extension if merged output isn't .mp4
@@ -77,81 +671,483 @@ def download_with_ytdlp(url: str, temp_dir: str) -> str:
         fps = info_dict.get("fps")
         fmt_note = info_dict.get("format_note")
         ext = info_dict.get("ext")
-        logging.info(f"[YTDLP] Downloaded format: {fmt_note or height}p @ {fps or '?'}fps ({ext})")
+        logging.info("[YTDLP] Downloaded format: %sp @ %sfps (%s)", fmt_note or height, fps or "?", ext)
 
     return downloaded
 
 
+# RFC 5987 attr-char, i.e. what may stay unescaped in filename*
+RFC5987_SAFE = "!#$&+-.^_`|~"
+
+
+def header_safe_filename(original_name: str) -> str:
+    """Sanitize the filename for the X-Filename header."""
+    return original_name if original_name.isascii() else quote(original_name)
+
+
+def disposition_names(original_name: str) -> dict:
+    """Content-Disposition filename parameters, RFC 5987-encoded when non-ASCII."""
+    if original_name.isascii():
+        return {"filename": original_name}
+    simple = unicodedata.normalize("NFKD", original_name).encode("ascii", "ignore").decode("ascii")
+    return {"filename": simple, "filename*": "UTF-8''" + quote(original_name, safe=RFC5987_SAFE)}
+
+
+def _advise_sequential(file):
+    """Tell the kernel the file will be read front to back (bigger readahead)."""
+    if hasattr(os, "posix_fadvise") and file is not None:
+        try:
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except (AttributeError, OSError, ValueError):
+            pass
+
+
+# TCP_CORK is Linux, TCP_NOPUSH the BSD/macOS equivalent
+TCP_CORK = getattr(socket, "TCP_CORK", None) or getattr(socket, "TCP_NOPUSH", None)
+# Unset by default: a fixed SO_SNDBUF turns off Linux's send buffer
+# autotuning (up to net.ipv4.tcp_wmem's max, 4 MiB by default) and is capped
+# at net.core.wmem_max (212992 by default; the kernel doubles it). Only set
+# it together with a raised wmem_max, e.g. `sysctl -w net.core.wmem_max=4194304`.
+SEND_BUFFER_BYTES = int(os.environ["SEND_BUFFER_BYTES"]) if os.environ.get("SEND_BUFFER_BYTES") else None
+
+
+def _cork_client_socket():
+    """Coalesce gunicorn's header write with the first sendfile() run.
+
+    gunicorn's post_request hook (gunicorn.conf.py) uncorks once the body
+    is out. SEND_BUFFER_BYTES, if configured, pins the send buffer size.
+    """
+    sock = request.environ.get("gunicorn.socket")
+    if sock is None or TCP_CORK is None:
+        return
+    try:
+        if SEND_BUFFER_BYTES:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES)
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_CORK, 1)
+    except OSError:
+        return
+    request.environ["yt_dlp_api.corked"] = True
+
+
+# Request headers that need Werkzeug's Range / 304 handling
+CONDITIONAL_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since", "If-Match", "If-Unmodified-Since")
+
+
+def file_response(downloaded_file: str, original_name=None, ephemeral=False, etag=None):
+    """Build the send_file response for a finished download.
+
+    ephemeral marks a one-shot file that no later request will revalidate,
+    so it gets no ETag and skips conditional processing unless this request
+    asks for a range. etag overrides Werkzeug's path/mtime-derived tag.
+    Returns (response, file_size), or None if the file is gone. A request
+    send_file rejects (an unsatisfiable Range) gets that error response
+    back with a file_size of 0.
+    """
+    # download_with_ytdlp always yields an .mp4, so there is nothing to guess
+    mime_type = "video/mp4"
+
+    # === Sanitize filename for headers ===
+    original_name = original_name or os.path.basename(downloaded_file)
+    safe_filename = header_safe_filename(original_name)
+
+    conditional = not ephemeral or any(h in request.headers for h in CONDITIONAL_HEADERS)
+
+    # send_file stats the file itself; a missing file surfaces here
+    try:
+        response = send_file(
+            downloaded_file,
+            as_attachment=True,
+            download_name=original_name,
+            mimetype=mime_type,
+            conditional=conditional,  # Supports range requests
+            etag=False if ephemeral else (etag or True),
+            max_age=0,
+        )
+        if not conditional:
+            # Still advertise resumability; a retry with Range takes the branch above
+            response.accept_ranges = "bytes"
+        # A ranged reply's Content-Length is only the slice
+        if response.status_code == 206:
+            file_size = response.content_range.length
+            # Werkzeug serves the slice through a Python _RangeWrapper, which
+            # gunicorn can't sendfile. gunicorn caps the body at Content-Length,
+            # so hand it a plain file wrapper positioned at the slice start.
+            if "gunicorn.socket" in request.environ:
+                response.response.close()
+                file = open(downloaded_file, "rb")
+                file.seek(response.content_range.start)
+                response.response = wrap_file(request.environ, file)
+        else:
+            file_size = response.content_length
+        # gunicorn's FileWrapper keeps the file as .filelike, Werkzeug's as .file
+        wrapped = response.response
+        _advise_sequential(getattr(wrapped, "filelike", None) or getattr(wrapped, "file", None))
+    except FileNotFoundError:
+        return None
+    except HTTPException as e:
+        # 416 with Content-Range: bytes */<size>, not a 500
+        logging.info("[RESPONSE] %s for %s", e.code, safe_filename)
+        return e.get_response(), 0
+
+    response.headers.update({"X-Filename": safe_filename, "X-Size-Bytes": str(file_size), "X-Mime-Type": mime_type})
+
+    _cork_client_socket()
+    logging.info("[SUCCESS] Sent file: %s (%s bytes)", safe_filename, file_size)
+    return response, file_size
+
+
+# === Background Jobs ===
+# POST /jobs returns 202 immediately and the download runs on a bounded pool.
+# Status lives next to the file on disk (not in memory) so any gunicorn
+# worker can answer the poll or serve the result.
+JOB_FOLDER = os.path.join(DOWNLOAD_FOLDER, "jobs")
+os.makedirs(JOB_FOLDER, exist_ok=True)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_TTL = int(os.environ.get("JOB_TTL", 3600))
+JOB_SWEEP_INTERVAL = 600
+# Jobs still in these states belong to a live worker; gunicorn.conf.py fails
+# the ones whose worker died (child_exit) or that predate a restart
+JOB_ACTIVE_STATES = ("queued", "running")
+
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="download-job")
+
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(JOB_FOLDER, job_id)
+
+
+def write_job_status(job_id: str, **status):
+    """Atomically replace the job's status.json."""
+    path = os.path.join(_job_dir(job_id), "status.json")
+    with open(path + ".tmp", "wb") as f:
+        f.write(orjson.dumps(status))
+    os.replace(path + ".tmp", path)
+
+
+def read_job_status(job_id: str):
+    try:
+        with open(os.path.join(_job_dir(job_id), "status.json"), "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def sweep_jobs():
+    """Delete job folders whose status has not changed for JOB_TTL.
+
+    run_job() schedules this itself, but that timer lives in the worker's
+    memory and is lost if the worker restarts within the hour.
+    """
+    cutoff = time.time() - JOB_TTL
+    with os.scandir(JOB_FOLDER) as entries:
+        for entry in entries:
+            status_path = os.path.join(entry.path, "status.json")
+            try:
+                if os.stat(status_path).st_mtime >= cutoff:
+                    continue
+                with open(status_path, "rb") as f:
+                    if orjson.loads(f.read()).get("status") in JOB_ACTIVE_STATES:
+                        continue
+            except FileNotFoundError:
+                # No status yet (or a half-deleted folder): go by the folder's age
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+            except (OSError, ValueError):
+                pass
+            _delete_path(entry.path, is_dir=True)
+
+
+def run_job(job_id: str, url: str):
+    """Download url into the job folder and record the outcome."""
+    job_dir = _job_dir(job_id)
+    try:
+        write_job_status(job_id, status="running", url=url, pid=os.getpid())
+        info_dict = probe_with_ytdlp(url)
+        downloaded_file = download_with_ytdlp(info_dict, job_dir)
+        file_size = os.stat(downloaded_file).st_size
+        write_job_status(
+            job_id, status="finished", url=url,
+            filename=os.path.basename(downloaded_file), size=file_size,
+        )
+        logging.info("[JOB] %s finished (%s bytes)", job_id, file_size)
+    except FileNotFoundError:
+        write_job_status(job_id, status="failed", url=url, error="File missing after download")
+    except yt_dlp.utils.DownloadError as e:
+        write_job_status(job_id, status="failed", url=url, error=f"DownloadError: {str(e)}")
+    except Exception as e:
+        logging.exception("[JOB] %s crashed", job_id)
+        write_job_status(job_id, status="failed", url=url, error=f"Unexpected error: {str(e)}")
+    finally:
+        # Results (and failures) stay pollable for JOB_TTL, then go
+        schedule_delete(job_dir, delay=JOB_TTL, is_dir=True)
+
+
+# === URL Validation ===
+# Rejected before yt-dlp is touched, so scanner junk costs no extraction
+URL_RE = re.compile(r"https?://\S{3,2048}", re.IGNORECASE)
+# Optional comma-separated allowlist; "youtube.com" also admits its subdomains
+ALLOWED_HOSTS = frozenset(
+    host.strip().lower() for host in os.environ.get("ALLOWED_HOSTS", "").split(",") if host.strip()
+)
+
+
+def url_error(url):
+    """Return an error message for an unusable url, or None if it may be fetched."""
+    if not isinstance(url, str) or not URL_RE.fullmatch(url):
+        return "Invalid URL: expected an http(s) URL"
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        host = None
+    if not host:
+        return "Invalid URL: missing host"
+    if ALLOWED_HOSTS:
+        labels = host.split(".")
+        if not any(".".join(labels[i:]) in ALLOWED_HOSTS for i in range(len(labels))):
+            return f"Host not allowed: {host}"
+    return None
+
 
 # === Routes ===
-@app.route("/download", methods=["POST"])
+# Fixed error bodies are serialized once instead of per request
+_CANNED_ERRORS = {
+    message: orjson.dumps({"error": message})
+    for message in (
+        "Missing query parameter 'url'",
+        "Missing field 'url' in JSON",
+        "File missing after download",
+        "Unknown job",
+    )
+}
+
+
+def canned_error(message: str, status: int) -> Response:
+    """JSON error response for one of the fixed messages above."""
+    return Response(_CANNED_ERRORS[message], status=status, mimetype="application/json")
+
+
+@app.route("/download", methods=["GET", "POST"])
 def download_video():
+    # Set only once a temp dir exists and nothing has scheduled its removal yet
+    need_cleanup = False
     try:
         # === Input Validation ===
-        data = request.get_json(silent=True)
-        url = data.get("url") if data else None
-        if not url:
-            return jsonify({"error": "Missing field 'url' in JSON"}), 400
+        # GET ?url=... lets browsers and download managers resume with Range;
+        # HEAD (which Flask adds to GET routes) takes the same query string
+        if request.method in ("GET", "HEAD"):
+            url = request.args.get("url")
+            if not url:
+                return canned_error("Missing query parameter 'url'", 400)
+        else:
+            data = request.get_json(silent=True)
+            url = data.get("url") if isinstance(data, dict) else None
+            if not url:
+                return canned_error("Missing field 'url' in JSON", 400)
+        error = url_error(url)
+        if error:
+            return jsonify({"error": error}), 400
 
-        logging.info(f"[REQUEST] Download requested for URL: {url}")
+        logging.info("[REQUEST] Download requested for URL: %s", url)
 
-        # === Temp workspace ===
-        temp_dir = tempfile.mkdtemp(dir=DOWNLOAD_FOLDER)
+        # === Cache lookup ===
+        cached = cache_get(url)
+        if cached:
+            etag = cached[1].get("etag")
+            # RFC 9110 13.1.2: only GET/HEAD may answer a matching tag with 304,
+            # compared weakly (a W/"..." tag from an intermediary still matches)
+            if etag and request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag):
+                logging.info("[CACHE] Not modified for URL: %s", url)
+                response = Response(status=304, headers={"ETag": f'"{etag}"'})
+                response.cache_control.no_cache = True
+                response.cache_control.max_age = 0
+                return response
+            sent = file_response(cached[0], cached[1]["original_name"], etag=etag)
+            if sent is not None:
+                logging.info("[CACHE] Hit for URL: %s", url)
+                return sent[0]
 
+        # === Resolve formats ===
         try:
-            downloaded_file = download_with_ytdlp(url, temp_dir)
+            info_dict = probe_with_ytdlp(url)
+            original_name = output_filename(info_dict)
+            safe_filename = header_safe_filename(original_name)
+            mime_type = "video/mp4"
+
+            # === HEAD: describe the download without starting it ===
+            # Download managers probe size and resumability first; a cache hit
+            # was already answered above by send_file's own HEAD handling.
+            if request.method == "HEAD":
+                response = Response(mimetype=mime_type)
+                response.headers.set("Content-Disposition", "attachment", **disposition_names(original_name))
+                response.headers.update({"X-Filename": safe_filename, "X-Mime-Type": mime_type})
+                # A ranged GET always takes the on-disk path, which serves ranges
+                response.accept_ranges = "bytes"
+                filesize = info_dict.get("filesize")
+                if filesize and not info_dict.get("requested_formats"):
+                    # A single format is downloaded as-is, so its size is exact
+                    response.content_length = filesize
+                    response.headers["X-Size-Bytes"] = str(filesize)
+                else:
+                    # Don't let Werkzeug advertise the empty body as length 0
+                    response.automatically_set_content_length = False
+                return response
+
+            # === Direct stream (no disk) ===
+            # A pipe can't seek, so ranged requests go to the file path
+            # (which also caches the file for the rest of the resume)
+            command = None if "Range" in request.headers else build_stream_command(info_dict)
+            if command:
+                argv, stdin_data, resumable = command
+                # Only an HTTP/1.1 body is chunk-framed by gunicorn (HEAD
+                # returned above and never reaches the stream)
+                sock = request.environ.get("gunicorn.socket")
+                splice_ok = (
+                    hasattr(os, "splice") and fcntl is not None
+                    and request.environ.get("SERVER_PROTOCOL") == "HTTP/1.1"
+                    # TLS is encrypted in userspace; raw bytes on the fd would
+                    # corrupt the session (gunicorn skips sendfile for it too)
+                    and not isinstance(sock, ssl.SSLSocket)
+                )
+                sock = sock if splice_ok else None
+                body = stream_with_ytdlp(argv, stdin_data, sock)
         except yt_dlp.utils.DownloadError as e:
-            shutil.rmtree(temp_dir, ignore_errors=True)
             return jsonify({"error": f"DownloadError: {str(e)}"}), 500
         except Exception as e:
-            shutil.rmtree(temp_dir, ignore_errors=True)
             return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
-        if not os.path.exists(downloaded_file):
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            return jsonify({"error": "File missing after download"}), 500
+        if command:
+            headers = [
+                ("Content-Disposition", dump_options_header("attachment", disposition_names(original_name))),
+                ("X-Filename", safe_filename),
+                ("X-Mime-Type", mime_type),
+            ]
+            if not resumable:
+                # ffmpeg's fragmented MP4 differs byte-for-byte from the
+                # file a ranged retry would get, so don't invite resumes
+                headers.append(("Accept-Ranges", "none"))
+            else:
+                # A progressive stream is the exact file the range path serves
+                headers.append(("Accept-Ranges", "bytes"))
+                if info_dict.get("filesize"):
+                    headers.append(("X-Size-Bytes", str(info_dict["filesize"])))
+            response = Response(body, mimetype=mime_type, headers=headers)
 
-        # === Metadata ===
-        file_size = os.path.getsize(downloaded_file)
-        mime_type, _ = mimetypes.guess_type(downloaded_file)
-        mime_type = mime_type or "application/octet-stream"
+            logging.info("[SUCCESS] Streaming file: %s", safe_filename)
+            return response
 
-        # === Cleanup scheduling ===
-        schedule_delete(downloaded_file, delay=15)
-        schedule_delete(temp_dir, delay=20, is_dir=True)
+        # === Temp workspace ===
+        # Only the on-disk fallback gets here; invalid URLs and direct
+        # streams never touch DOWNLOAD_FOLDER
+        in_memory = tmpfs_has_room(info_dict, expected_size(info_dict))
+        temp_dir = acquire_workspace(in_memory)
+        need_cleanup = True
 
-        # === Sanitize filename for headers ===
-        original_name = os.path.basename(downloaded_file)
         try:
-            safe_filename = original_name.encode("latin-1").decode("latin-1")
-        except UnicodeEncodeError:
-            safe_filename = quote(original_name)
-
-        # === Build response ===
-        response = send_file(
-            downloaded_file,
-            as_attachment=True,
-            download_name=original_name,
-            mimetype=mime_type,
-            conditional=True,  # Supports range requests
-            max_age=0,
-        )
+            try:
+                downloaded_file = download_with_ytdlp(info_dict, temp_dir)
+            except Exception as e:
+                # Sizes are only hints and other requests share the tmpfs
+                if not in_memory or not _is_out_of_space(e):
+                    raise
+                logging.info("[WORKSPACE] tmpfs full, retrying on disk: %s", url)
+                discard_workspace(temp_dir)
+                in_memory = False
+                temp_dir = acquire_workspace()
+                downloaded_file = download_with_ytdlp(info_dict, temp_dir)
+        except yt_dlp.utils.DownloadError as e:
+            discard_workspace(temp_dir)
+            return jsonify({"error": f"DownloadError: {str(e)}"}), 500
+        except Exception as e:
+            discard_workspace(temp_dir)
+            return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
 
-        response.headers["X-Filename"] = safe_filename
-        response.headers["X-Size-Bytes"] = str(file_size)
-        response.headers["X-Mime-Type"] = mime_type
+        # === Cache, then build response ===
+        # Cached before serving so a request send_file rejects (a Range past
+        # the end) still leaves the download for the client's next try
+        try:
+            file_size = os.path.getsize(downloaded_file)
+        except FileNotFoundError:
+            discard_workspace(temp_dir)
+            need_cleanup = False
+            return canned_error("File missing after download", 500)
+        cached = cache_put(url, downloaded_file, os.path.basename(downloaded_file), file_size)
+        if cached:
+            sent = file_response(cached[0], cached[1]["original_name"], etag=cached[1].get("etag"))
+        else:
+            sent = file_response(downloaded_file, ephemeral=True)
+        if sent is None:
+            discard_workspace(temp_dir)
+            need_cleanup = False
+            return canned_error("File missing after download", 500)
+        response = sent[0]
 
-        logging.info(f"[SUCCESS] Sent file: {safe_filename} ({file_size} bytes)")
+        # send_file already holds the file open, so unlink it now: the fd keeps
+        # serving the body, and the kernel frees the blocks and drops the
+        # page-cache pages the moment the response closes it. (call_on_close
+        # never fires here because send_file responses are direct_passthrough.)
+        # A file moved into the cache above just leaves an empty folder.
+        discard_workspace(temp_dir)
+        need_cleanup = False
         return response
 
     except Exception as e:
         logging.exception("[FATAL] Unhandled exception in /download")
+        if need_cleanup:
+            discard_workspace(temp_dir)
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/", methods=["GET"])
-def index():
-    return """
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    data = request.get_json(silent=True)
+    url = data.get("url") if isinstance(data, dict) else None
+    if not url:
+        return canned_error("Missing field 'url' in JSON", 400)
+    error = url_error(url)
+    if error:
+        return jsonify({"error": error}), 400
+
+    job_id = str(uuid.uuid4())
+    os.makedirs(_job_dir(job_id))
+    write_job_status(job_id, status="queued", url=url, pid=os.getpid())
+    _job_pool.submit(run_job, job_id, url)
+    logging.info("[JOB] %s queued for URL: %s", job_id, url)
+
+    status_url = url_for("job_status", job_id=job_id, _external=True)
+    return jsonify({"job_id": job_id, "status_url": status_url}), 202, {"Location": status_url}
+
+
+@app.route("/jobs/<uuid:job_id>", methods=["GET"])
+def job_status(job_id):
+    job_id = str(job_id)
+    status = read_job_status(job_id)
+    if status is None:
+        return canned_error("Unknown job", 404)
+
+    status.pop("pid", None)  # owning worker, internal bookkeeping
+    status["job_id"] = job_id
+    if status["status"] == "finished":
+        status["download_url"] = url_for("job_file", job_id=job_id, _external=True)
+    return jsonify(status)
+
+
+@app.route("/jobs/<uuid:job_id>/file", methods=["GET"])
+def job_file(job_id):
+    job_id = str(job_id)
+    status = read_job_status(job_id)
+    if status is None:
+        return canned_error("Unknown job", 404)
+    if status["status"] != "finished":
+        return jsonify({"error": f"Job is {status['status']}"}), 409
+
+    sent = file_response(os.path.join(_job_dir(job_id), status["filename"]))
+    if sent is None:
+        return canned_error("Unknown job", 404)
+    return sent[0]
+
+
+# Rendered once; the landing page doubles as the load balancer health check
+INDEX_HTML = """
     <html>
     <head>
         <title>yt-dlp API</title>
@@ -216,6 +1212,7 @@ def index():
             <pre>{
     "url": "https://www.youtube.com/watch?v=EXAMPLE"
 }</pre>
+            <p>Or <code>GET /download?url=...</code>, which also honors <code>Range</code> for resumed downloads and answers <code>If-None-Match</code> with <code>304</code> while the file is cached.</p>
 
             <h2>📥 Response</h2>
             <p>The server responds with the binary MP4 file. Example headers:</p>
@@ -225,13 +1222,34 @@ def index():
     "X-Mime-Type": "video/mp4"
 }</pre>
 
+            <h2>⏳ Background jobs</h2>
+            <p>For long downloads, <code>POST /jobs</code> with the same JSON returns <code>202</code> right away:</p>
+            <pre>{
+    "job_id": "…",
+    "status_url": "https://…/jobs/…"
+}</pre>
+            <p>Poll <code>GET /jobs/&lt;job_id&gt;</code> until <code>status</code> is <code>finished</code>, then fetch <code>download_url</code>.</p>
+
             <div class="footer">Built with ❤️ Flask + yt-dlp</div>
         </div>
     </body>
     </html>
-    """
+    """.encode("utf-8")
+
+
+@app.route("/", methods=["GET"])
+def index():
+    response = Response(INDEX_HTML, mimetype="text/html")
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
 
 
 # === App Entrypoint ===
+# Development server only; production runs under gunicorn (see gunicorn.conf.py).
+# Kept single-threaded on purpose so slow or blocking paths show up locally
+# instead of being hidden behind Werkzeug's thread-per-request mode.
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8080, threaded=True)
+    start_reaper()
+    warm_up()
+    app.run(host="0.0.0.0", port=8080, threaded=False)
@@ -0,0 +1,180 @@
+import os
+
+# === Gunicorn Configuration ===
+# Production entrypoint: `gunicorn -c gunicorn.conf.py app:app`
+# `python app.py` only runs the Flask development server.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# /download is an I/O proxy (yt-dlp network fetch, disk, socket send), so each
+# worker runs a gevent event loop that multiplexes many in-flight downloads
+# instead of parking one OS thread per request.
+worker_class = "gevent"
+# One worker per usable CPU so yt-dlp's Python work (extraction, format
+# selection) scales past the GIL; WEB_CONCURRENCY overrides on small plans.
+# sched_getaffinity honours CPU pinning but is Linux-only (not on macOS).
+_usable_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+workers = int(os.environ.get("WEB_CONCURRENCY", _usable_cpus))
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", "1000"))
+
+# Downloads can take minutes; the gevent worker heartbeats independently of
+# request duration, so this only catches genuinely wedged workers.
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = "info"
+
+
+# === Server Hooks ===
+# Mirrors app.py's Background Jobs settings; app.py is deliberately not
+# imported by the master (gevent must patch before the app loads).
+JOB_FOLDER = os.path.join("downloads", "jobs")
+JOB_TTL = int(os.environ.get("JOB_TTL", 3600))
+
+
+def _sweep_jobs(server, dead_pid=None):
+    """Fail jobs orphaned by dead workers and delete expired job folders.
+
+    With dead_pid None (master start-up) no worker is alive, so every
+    queued or running job is orphaned; otherwise only that worker's jobs.
+    """
+    import json
+    import shutil
+    import time
+
+    cutoff = time.time() - JOB_TTL
+    try:
+        entries = os.listdir(JOB_FOLDER)
+    except OSError:
+        return
+    for name in entries:
+        job_dir = os.path.join(JOB_FOLDER, name)
+        status_path = os.path.join(job_dir, "status.json")
+        # A worker's own sweep may delete the folder under us; an exception
+        # escaping child_exit would take the whole arbiter down
+        try:
+            try:
+                mtime = os.stat(status_path).st_mtime
+                with open(status_path, "rb") as f:
+                    status = json.load(f)
+            except FileNotFoundError:
+                status, mtime = {}, os.stat(job_dir).st_mtime
+            if status.get("status") in ("queued", "running"):
+                if dead_pid is None or status.get("pid") == dead_pid:
+                    failed = {"status": "failed", "url": status.get("url"), "error": "Worker exited before the job finished"}
+                    with open(status_path + ".tmp", "w") as f:
+                        json.dump(failed, f)
+                    os.replace(status_path + ".tmp", status_path)
+                    server.log.info(f"[JOB] {name} marked failed (worker gone)")
+            elif mtime < cutoff:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except (OSError, ValueError):
+            continue
+
+
+def on_starting(server):
+    # Each worker keeps its own pool of empty download folders (app.py,
+    # Workspace Pool); sweep whatever a killed previous run left behind before
+    # any worker forks. app.py is deliberately not imported here.
+    import glob
+    import shutil
+
+    stale = glob.glob(os.path.join("downloads", "workspace-*"))
+    stale += glob.glob(os.path.join("downloads", "tmp*"))
+    stale += glob.glob(os.path.join("/dev/shm", "yt-dlp-api-*"))
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
+    if stale:
+        server.log.info(f"[CLEANUP] Removed {len(stale)} stale download folders")
+    _sweep_jobs(server)
+
+
+def child_exit(server, worker):
+    # A worker that exits (HUP reload, timeout kill, crash) takes its job
+    # threads and its in-memory delete timers with it
+    import glob
+    import shutil
+
+    # Its workspace pool and any half-finished downloads (app.py tags them
+    # with the worker's pid)
+    stale = glob.glob(os.path.join("downloads", f"workspace-{worker.pid}-*"))
+    stale += glob.glob(os.path.join("/dev/shm", f"yt-dlp-api-{worker.pid}-*"))
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
+    _sweep_jobs(server, dead_pid=worker.pid)
+
+
+# === Worker Hooks ===
+def _gevent_sendfile(self, file, offset=0, count=None):
+    """Cooperative os.sendfile() for gevent sockets.
+
+    gevent's socket.sendfile() always falls back to an 8 KiB read/send loop,
+    which drags every byte of the MP4 through Python. This keeps the kernel
+    zero-copy path and yields to the hub whenever the socket buffer is full.
+    """
+    from gevent.socket import wait_write
+
+    self._check_sendfile_params(file, offset, count)
+    try:
+        fileno = file.fileno()
+        fsize = os.fstat(fileno).st_size
+    except (AttributeError, OSError, ValueError):
+        return self._sendfile_use_send(file, offset, count)
+    if not fsize:
+        return 0
+
+    sockno = self.fileno()
+    blocksize = min(count or fsize, 1 << 30)
+    total_sent = 0
+    try:
+        while True:
+            if count:
+                blocksize = min(count - total_sent, blocksize)
+                if blocksize <= 0:
+                    break
+            try:
+                sent = os.sendfile(sockno, fileno, offset, blocksize)
+            except BlockingIOError:
+                wait_write(sockno, timeout=self.gettimeout())
+                continue
+            if sent == 0:
+                break  # EOF
+            offset += sent
+            total_sent += sent
+        return total_sent
+    finally:
+        if total_sent > 0 and hasattr(file, "seek"):
+            file.seek(offset)
+
+
+def post_worker_init(worker):
+    # gunicorn hands wsgi.file_wrapper responses (Flask's send_file) to
+    # socket.sendfile(); make that zero-copy under the gevent worker too.
+    if worker_class == "gevent" and hasattr(os, "sendfile"):
+        from gevent import socket as gsocket
+
+        gsocket.socket.sendfile = _gevent_sendfile
+
+    # The app is loaded by now (post_fork would be too early: the gevent
+    # worker patches and imports it afterwards), so start the cleanup reaper
+    # and warm yt-dlp before the worker accepts its first request.
+    from app import start_reaper, warm_up
+
+    start_reaper()
+    warm_up()
+
+
+def post_request(worker, req, environ, resp):
+    # app.file_response() corks the client socket so the headers ride in the
+    # same segments as the first sendfile() run; flush the tail now.
+    if environ.get("yt_dlp_api.corked"):
+        import socket
+
+        cork = getattr(socket, "TCP_CORK", None) or getattr(socket, "TCP_NOPUSH", None)
+        try:
+            environ["gunicorn.socket"].setsockopt(socket.IPPROTO_TCP, cork, 0)
+        except OSError:
+            pass